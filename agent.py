@@ -4,15 +4,20 @@ from dotenv import load_dotenv
 import fitz
 import chromadb
 import hashlib
+import sqlite3
 import uuid
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Set up LangSmith observability
-from langsmith_config import setup_langsmith
+from langsmith_config import setup_langsmith, log_error
 setup_langsmith()
 
+from document_lifecycle import CHROMA_DB_PATH, COLLECTION_NAME, record_access
+from request_coalescing import single_flight
+from lexical_index import lexical_index, answers_locally, reciprocal_rank_fusion
+
 if OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key_here":
     from langchain_openai import ChatOpenAI, OpenAIEmbeddings
     from langgraph.graph import StateGraph, END
@@ -26,8 +31,8 @@ if OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key_here":
     embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
     
     # Initialize ChromaDB client
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-    collection_name = "medical_documents"
+    chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    collection_name = COLLECTION_NAME
     
     class AgentState(TypedDict):
         question: str
@@ -40,6 +45,7 @@ if OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key_here":
         relevant_chunks: List[str]
         session_id: str
         query_id: str
+        retrieval_mode: str
 
     @tool
     def analyze_medical_text(text: str) -> str:
@@ -175,6 +181,17 @@ Please provide a comprehensive medical analysis following the above instructions
                 ids=ids
             )
             
+            # Index the same chunks for exact-term lookups
+            try:
+                lexical_index.add(ids, chunks, document_id)
+            except sqlite3.Error as e:
+                # The chunks are already stored; the index can be rebuilt later
+                log_error(f"Lexical indexing failed for document {document_id}, run `python lexical_index.py --rebuild`", e)
+            
+            # Start the document's retention clock
+            filename = metadata[0].get("filename") if metadata else None
+            record_access([document_id], filename=filename)
+            
             return f"Successfully stored {len(chunks)} chunks in ChromaDB for document {document_id}"
             
         except Exception as e:
@@ -182,54 +199,93 @@ Please provide a comprehensive medical analysis following the above instructions
 
     @tool
     def query_chromadb(query: str, n_results: int = 5) -> Dict:
-        """Query ChromaDB for relevant chunks based on semantic similarity"""
+        """Query ChromaDB for relevant chunks, fusing BM25 lexical and semantic similarity ranks"""
         try:
             # Get collection
             collection = chroma_client.get_collection(name=collection_name)
             
-            # Generate embedding for query
-            query_embedding = embeddings.embed_query(query)
+            # Lexical search runs locally, without an embedding call
+            lexical_hits = lexical_index.search(query, n_results=n_results * 2)
+            chunk_data = {}
+            if lexical_hits:
+                lexical_chunks = collection.get(
+                    ids=[chunk_id for chunk_id, _ in lexical_hits],
+                    include=["documents", "metadatas"]
+                )
+                for chunk_id, doc, metadata in zip(lexical_chunks["ids"], lexical_chunks["documents"], lexical_chunks["metadatas"]):
+                    chunk_data[chunk_id] = {"content": doc, "metadata": metadata or {}, "distance": None}
+            lexical_scores = {chunk_id: score for chunk_id, score in lexical_hits if chunk_id in chunk_data}
+            lexical_ids = list(lexical_scores)
             
-            # Query ChromaDB
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
+            # Term-heavy queries whose exact terms were all found skip the dense search
+            answered_locally = answers_locally(
+                query, [chunk_data[chunk_id]["content"] for chunk_id in lexical_ids[:n_results]]
             )
             
+            vector_ids = []
+            if not answered_locally:
+                # Generate embedding for query
+                query_embedding = embeddings.embed_query(query)
+                
+                # Query ChromaDB
+                results = collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_results * 2 if lexical_ids else n_results,
+                    include=["documents", "metadatas", "distances"]
+                )
+                for chunk_id, doc, metadata, distance in zip(
+                    results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+                ):
+                    chunk_data[chunk_id] = {"content": doc, "metadata": metadata or {}, "distance": distance}
+                    vector_ids.append(chunk_id)
+            
+            ranked_ids = [chunk_id for chunk_id, _ in reciprocal_rank_fusion(lexical_ids, vector_ids)][:n_results]
+            retrieval_mode = "lexical" if answered_locally else ("hybrid" if lexical_ids else "vector")
+            
+            # Keep documents that answer queries from being expired
+            record_access([chunk_data[chunk_id]["metadata"].get("document_id") for chunk_id in ranked_ids])
+            
             # Format results with similarity scores
             formatted_chunks = []
-            if results.get("documents") and len(results["documents"]) > 0:
-                documents = results["documents"][0]  # First result set
-                metadatas = results.get("metadatas", [[]])[0]
-                distances = results.get("distances", [[]])[0]
+            for i, chunk_id in enumerate(ranked_ids):
+                doc = chunk_data[chunk_id]["content"]
+                metadata = chunk_data[chunk_id]["metadata"]
+                distance = chunk_data[chunk_id]["distance"]
+                # Lexical-only chunks have no vector similarity; their BM25 score is reported separately
+                similarity_score = round(1 - distance, 3) if distance is not None else None  # Convert distance to similarity
+                bm25_score = round(lexical_scores[chunk_id], 3) if chunk_id in lexical_scores else None
+                score_label = ", ".join(
+                    f"{label}: {score}" for label, score in [("Similarity", similarity_score), ("BM25", bm25_score)]
+                    if score is not None
+                )
+                # Create human-readable reference
+                page_ref = f"Page ~{metadata.get('estimated_page', '?')}" if metadata.get('estimated_page') else ""
+                preview = metadata.get('preview', 'Content preview not available')
+                reference_id = metadata.get('reference_id', f"Section-{metadata.get('chunk_index', 0) + 1}")
+                
+                chunk_info = f"{reference_id} ({page_ref}): '{preview}'"
                 
-                for i, (doc, metadata, distance) in enumerate(zip(documents, metadatas, distances)):
-                    similarity_score = 1 - distance  # Convert distance to similarity
-                    # Create human-readable reference
-                    page_ref = f"Page ~{metadata.get('estimated_page', '?')}" if metadata.get('estimated_page') else ""
-                    preview = metadata.get('preview', 'Content preview not available')
-                    reference_id = metadata.get('reference_id', f"Section-{metadata.get('chunk_index', 0) + 1}")
-                    
-                    chunk_info = f"{reference_id} ({page_ref}): '{preview}'"
-                    
-                    formatted_chunks.append({
-                        "rank": i + 1,
-                        "content": doc,
-                        "similarity_score": round(similarity_score, 3),
-                        "metadata": metadata,
-                        "chunk_info": chunk_info,
-                        "reference_id": reference_id,
-                        "page_ref": page_ref,
-                        "preview": preview
-                    })
+                formatted_chunks.append({
+                    "rank": i + 1,
+                    "content": doc,
+                    "similarity_score": similarity_score,
+                    "bm25_score": bm25_score,
+                    "score_label": score_label,
+                    "metadata": metadata,
+                    "chunk_info": chunk_info,
+                    "reference_id": reference_id,
+                    "page_ref": page_ref,
+                    "preview": preview
+                })
             
+            documents = [[chunk_data[chunk_id]["content"] for chunk_id in ranked_ids]]
             return {
-                "documents": results.get("documents", []),
-                "metadatas": results.get("metadatas", []),
-                "distances": results.get("distances", []),
+                "documents": documents,
+                "metadatas": [[chunk_data[chunk_id]["metadata"] for chunk_id in ranked_ids]],
+                "distances": [[chunk_data[chunk_id]["distance"] for chunk_id in ranked_ids]],
                 "formatted_chunks": formatted_chunks,
-                "count": len(results.get("documents", []))
+                "retrieval_mode": retrieval_mode,
+                "count": len(documents)
             }
             
         except Exception as e:
@@ -249,18 +305,17 @@ Please provide a comprehensive medical analysis following the above instructions
     def pdf_processor(state: AgentState) -> AgentState:
         """Process PDF with semantic chunking and ChromaDB storage"""
         if state["pdf_content"] and state["pdf_metadata"]:
-            # Generate document ID
-            document_id = str(uuid.uuid4())[:8]
-            state["document_id"] = document_id
-            
-            # Perform semantic chunking
-            chunking_result = semantic_chunk_text.invoke({
-                "text": state["pdf_content"], 
-                "filename": state["pdf_metadata"].get("filename", "document.pdf")
-            })
-            
-            if "error" not in chunking_result:
-                state["pdf_chunks"] = chunking_result["chunks"]
+            def ingest() -> Dict:
+                # Generate document ID
+                document_id = str(uuid.uuid4())[:8]
+                
+                # Perform semantic chunking
+                chunking_result = semantic_chunk_text.invoke({
+                    "text": state["pdf_content"], 
+                    "filename": state["pdf_metadata"].get("filename", "document.pdf")
+                })
+                if "error" in chunking_result:
+                    return {"document_id": document_id, "error": chunking_result["error"]}
                 
                 # Store in ChromaDB
                 storage_result = store_in_chromadb.invoke({
@@ -268,11 +323,24 @@ Please provide a comprehensive medical analysis following the above instructions
                     "metadata": chunking_result["metadata"],
                     "document_id": document_id
                 })
-                
+                return {
+                    "document_id": document_id,
+                    "chunks": chunking_result["chunks"],
+                    "total_chunks": chunking_result["total_chunks"],
+                    "storage_result": storage_result
+                }
+            
+            # Sessions uploading the same PDF at once share a single ingestion
+            content_hash = hashlib.sha256(state["pdf_content"].encode()).hexdigest()
+            ingestion = single_flight(f"ingest:{content_hash}", ingest)
+            state["document_id"] = ingestion["document_id"]
+            
+            if "error" not in ingestion:
+                state["pdf_chunks"] = ingestion["chunks"]
                 state["tools_used"].extend(["semantic_chunk_text", "store_in_chromadb"])
-                state["analysis"] = f"📄 **PDF Processed Successfully**\n\n{storage_result}\n\nTotal chunks: {chunking_result['total_chunks']}"
+                state["analysis"] = f"📄 **PDF Processed Successfully**\n\n{ingestion['storage_result']}\n\nTotal chunks: {ingestion['total_chunks']}"
             else:
-                state["analysis"] = f"❌ **PDF Processing Failed**: {chunking_result['error']}"
+                state["analysis"] = f"❌ **PDF Processing Failed**: {ingestion['error']}"
         
         return state
 
@@ -291,7 +359,7 @@ Please provide a comprehensive medical analysis following the above instructions
                 
                 # Create human-readable chunks section
                 chunks_text = [
-                    f"**Rank {chunk['rank']} (Similarity: {chunk['similarity_score']}) - {chunk['chunk_info']}:**\n{chunk['content']}"
+                    f"**Rank {chunk['rank']} ({chunk['score_label']}) - {chunk['chunk_info']}:**\n{chunk['content']}"
                     for chunk in formatted_chunks
                 ]
                 
@@ -313,6 +381,7 @@ Please provide a comprehensive medical analysis following the above instructions
                     'page_ref': chunk.get('page_ref', ''),
                     'preview': chunk.get('preview', '')
                 } for i, chunk in enumerate(formatted_chunks[:5])]
+                state["retrieval_mode"] = query_result.get("retrieval_mode", "vector")
                 state["tools_used"].append("query_chromadb")
             else:
                 analysis_content = state["pdf_content"][:2000]
@@ -385,7 +454,12 @@ Based on the medical question and the provided PDF document analysis, here are t
         # Count chunks if available
         chunk_info = ""
         if "query_chromadb" in state["tools_used"]:
-            chunk_info = " | Vector similarity search performed on document chunks"
+            retrieval_descriptions = {
+                "lexical": "Exact-term (BM25) search performed on document chunks",
+                "hybrid": "Hybrid BM25 + vector similarity search performed on document chunks",
+                "vector": "Vector similarity search performed on document chunks"
+            }
+            chunk_info = f" | {retrieval_descriptions[state.get('retrieval_mode') or 'vector']}"
         
         response = f"""🤖 **AI Medical Research Analysis**
 
@@ -437,14 +511,22 @@ Based on the medical question and the provided PDF document analysis, here are t
                 "document_id": None,
                 "relevant_chunks": [],
                 "session_id": session_id,
-                "query_id": str(uuid.uuid4())
+                "query_id": str(uuid.uuid4()),
+                "retrieval_mode": ""
             }
             
-            # Run the workflow
-            agent = create_medical_agent()
-            final_state = agent.invoke(initial_state)
+            def run_workflow() -> str:
+                agent = create_medical_agent()
+                final_state = agent.invoke(initial_state)
+                return final_state.get('analysis', 'No analysis generated')
             
-            analysis = final_state.get('analysis', 'No analysis generated')
+            # Identical (document, question, model) requests share one workflow run
+            query_hash = hashlib.sha256("\0".join([
+                hashlib.sha256(pdf_content.encode()).hexdigest(),
+                question,
+                llm.model_name
+            ]).encode()).hexdigest()
+            analysis = single_flight(f"query:{query_hash}", run_workflow)
             
             return analysis
                 
@@ -10,6 +10,10 @@ if st.session_state.api_key_loaded:
     os.environ["OPENAI_API_KEY"] = api_key
 
 from agent import process_medical_query, extract_pdf_text
+from document_lifecycle import start_background_gc
+
+# Expire stale documents periodically when DOCUMENT_GC_INTERVAL_HOURS is set
+start_background_gc()
 
 st.set_page_config(page_title="AI Medical Agent", layout="wide")
 
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Retrieval Benchmark for exact medical-term queries
+Compares latency and hit rate of lexical (BM25), vector, fused and routed retrieval on a PDF
+"""
+
+import os
+import random
+import tempfile
+import time
+import argparse
+from collections import Counter
+from statistics import mean, median
+from typing import Callable, Dict, List
+from dotenv import load_dotenv
+import fitz
+
+from lexical_index import LexicalIndex, TOKEN_PATTERN, tokenize, answers_locally, reciprocal_rank_fusion
+
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+
+def load_chunks(pdf_path: str) -> List[str]:
+    """Extract and chunk a PDF with the same splitter settings as agent.py"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    pdf_document = fitz.open(pdf_path)
+    text = "".join(page.get_text() for page in pdf_document)
+    pdf_document.close()
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=800,
+        chunk_overlap=100,
+        separators=["\n\n", "\n", ". ", " "]
+    )
+    return text_splitter.split_text(text)
+
+
+def build_term_queries(chunks: List[str], limit: int, seed: int = 0) -> List[Dict]:
+    """Sample codes, dosages and trial IDs (tokens containing digits) that occur in few chunks"""
+    chunk_frequency = Counter()
+    for chunk in chunks:
+        chunk_frequency.update(set(TOKEN_PATTERN.findall(chunk.lower())))
+    terms = sorted(
+        term for term, frequency in chunk_frequency.items()
+        if frequency <= 3 and len(term) >= 3 and any(ch.isdigit() for ch in term) and not term.isdigit()
+    )
+    random.Random(seed).shuffle(terms)
+    return [
+        {"query": template.format(term=term), "term": term}
+        for term in terms[:limit]
+        for template in ["{term}", "What does the document report about {term}?"]
+    ]
+
+
+def run_benchmark(name: str, search: Callable[[str], List[str]], chunks: List[str], queries: List[Dict]) -> Dict:
+    """Time a retrieval function and count queries whose top results contain the exact term"""
+    latencies = []
+    hits = 0
+    for item in queries:
+        start = time.perf_counter()
+        chunk_ids = search(item["query"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        if any(item["term"] in tokenize(chunks[int(chunk_id)]) for chunk_id in chunk_ids):
+            hits += 1
+    return {
+        "name": name,
+        "hit_rate": hits / len(queries),
+        "mean_ms": mean(latencies),
+        "median_ms": median(latencies),
+        "p95_ms": sorted(latencies)[int(0.95 * (len(latencies) - 1))]
+    }
+
+
+def main():
+    """Command-line entry point for the retrieval benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark lexical vs vector retrieval on term queries")
+    parser.add_argument("pdf", help="PDF document to index")
+    parser.add_argument("--terms", type=int, default=25, help="Number of exact terms to sample")
+    parser.add_argument("--top-k", type=int, default=5, help="Results retrieved per query")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.pdf)
+    chunk_ids = [str(i) for i in range(len(chunks))]
+    queries = build_term_queries(chunks, args.terms)
+    if not queries:
+        print("⚠️  No code or dosage terms found in the document")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = LexicalIndex(os.path.join(tmp_dir, "lexical_index.sqlite3"))
+        index.add(chunk_ids, chunks)
+
+        def lexical_search(query: str) -> List[str]:
+            return [chunk_id for chunk_id, _ in index.search(query, n_results=args.top_k)]
+
+        results = [run_benchmark("Lexical (BM25)", lexical_search, chunks, queries)]
+
+        if OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key_here":
+            import chromadb
+            from langchain_openai import OpenAIEmbeddings
+            embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
+            collection = chromadb.EphemeralClient().create_collection(name="retrieval_benchmark")
+            collection.add(ids=chunk_ids, documents=chunks, embeddings=embeddings.embed_documents(chunks))
+
+            def vector_search(query: str, n_results: int = args.top_k) -> List[str]:
+                result = collection.query(
+                    query_embeddings=[embeddings.embed_query(query)],
+                    n_results=min(n_results, len(chunks))
+                )
+                return result["ids"][0]
+
+            def hybrid_search(query: str) -> List[str]:
+                lexical_ids = [chunk_id for chunk_id, _ in index.search(query, n_results=args.top_k * 2)]
+                vector_ids = vector_search(query, n_results=args.top_k * 2)
+                return [chunk_id for chunk_id, _ in reciprocal_rank_fusion(lexical_ids, vector_ids)][:args.top_k]
+
+            def routed_search(query: str) -> List[str]:
+                # Same decision query_chromadb makes before falling back to fused ranking
+                lexical_ids = [chunk_id for chunk_id, _ in index.search(query, n_results=args.top_k * 2)]
+                if answers_locally(query, [chunks[int(chunk_id)] for chunk_id in lexical_ids[:args.top_k]]):
+                    return lexical_ids[:args.top_k]
+                vector_ids = vector_search(query, n_results=args.top_k * 2 if lexical_ids else args.top_k)
+                return [chunk_id for chunk_id, _ in reciprocal_rank_fusion(lexical_ids, vector_ids)][:args.top_k]
+
+            results.append(run_benchmark("Vector (embed + query)", vector_search, chunks, queries))
+            results.append(run_benchmark("Hybrid (RRF)", hybrid_search, chunks, queries))
+            results.append(run_benchmark("Routed (as shipped)", routed_search, chunks, queries))
+        else:
+            print("⚠️  OPENAI_API_KEY not set - benchmarking lexical retrieval only")
+
+    print("📊 RETRIEVAL BENCHMARK")
+    print("=" * 72)
+    print(f"📄 {os.path.basename(args.pdf)}: {len(chunks)} chunks, {len(queries)} term queries, top-{args.top_k}")
+    print()
+    print(f"{'Method':<26}{'Hit rate':>10}{'Mean ms':>12}{'Median ms':>12}{'P95 ms':>12}")
+    for result in results:
+        print(f"{result['name']:<26}{result['hit_rate']:>10.1%}{result['mean_ms']:>12.2f}"
+              f"{result['median_ms']:>12.2f}{result['p95_ms']:>12.2f}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
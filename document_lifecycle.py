@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+"""
+Document Lifecycle Management for the medical_documents collection
+Tracks document access times and garbage-collects the persistent ChromaDB store
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import argparse
+import uuid
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+import chromadb
+
+from langsmith_config import log_info, log_error
+
+load_dotenv()
+
+# Storage locations shared with agent.py
+CHROMA_DB_PATH = "./chroma_db"
+COLLECTION_NAME = "medical_documents"
+LIFECYCLE_DB_PATH = os.path.join(CHROMA_DB_PATH, "document_lifecycle.sqlite3")
+
+# Retention policy (0 disables the corresponding limit)
+DOCUMENT_TTL_DAYS = float(os.getenv("DOCUMENT_TTL_DAYS", "30"))
+DOCUMENT_MAX_SIZE_MB = float(os.getenv("DOCUMENT_MAX_SIZE_MB", "0"))
+DOCUMENT_GC_INTERVAL_HOURS = float(os.getenv("DOCUMENT_GC_INTERVAL_HOURS", "0"))
+
+# Bytes per stored embedding component (float32)
+EMBEDDING_COMPONENT_BYTES = 4
+# A collecting worker that has not released its lease within this time is presumed dead
+GC_LEASE_SECONDS = 3600
+# Rebuild the vector index once this share of its chunks has been deleted since the last rebuild
+INDEX_REBUILD_RATIO = float(os.getenv("DOCUMENT_INDEX_REBUILD_RATIO", "0.2"))
+COMPACTING_COLLECTION_NAME = f"{COLLECTION_NAME}_compacting"
+
+_WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_registry_lock = threading.Lock()
+_gc_thread = None
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the access registry, creating it on first use"""
+    os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+    conn = sqlite3.connect(LIFECYCLE_DB_PATH, timeout=30)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS document_access (
+            document_id TEXT PRIMARY KEY,
+            filename TEXT,
+            created_at REAL NOT NULL,
+            last_accessed REAL NOT NULL,
+            access_count INTEGER NOT NULL DEFAULT 0
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS gc_lease (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS gc_state (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL
+        )"""
+    )
+    return conn
+
+
+def _get_state(conn: sqlite3.Connection, name: str) -> float:
+    row = conn.execute("SELECT value FROM gc_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _set_state(conn: sqlite3.Connection, name: str, value: float):
+    conn.execute("INSERT OR REPLACE INTO gc_state (name, value) VALUES (?, ?)", (name, value))
+
+
+def _acquire_gc_lease(min_interval_seconds: float = 0) -> Optional[str]:
+    """Take the in-progress GC lease
+
+    Returns None on success, "running" when another worker is collecting right now,
+    or "not_due" when a run finished less than min_interval_seconds ago.
+    """
+    now = time.time()
+    with _registry_lock:
+        conn = _connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires_at FROM gc_lease WHERE name = 'document_gc'").fetchone()
+            if row and row[0] != _WORKER_ID and row[1] > now:
+                conn.execute("COMMIT")
+                return "running"
+            if min_interval_seconds > 0 and now - _get_state(conn, "last_run_at") < min_interval_seconds:
+                conn.execute("COMMIT")
+                return "not_due"
+            conn.execute(
+                "INSERT OR REPLACE INTO gc_lease (name, owner, expires_at) VALUES ('document_gc', ?, ?)",
+                (_WORKER_ID, now + GC_LEASE_SECONDS)
+            )
+            conn.execute("COMMIT")
+            return None
+        finally:
+            conn.close()
+
+
+def _release_gc_lease():
+    """Release the in-progress GC lease and record when the run finished"""
+    with _registry_lock:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM gc_lease WHERE name = 'document_gc' AND owner = ?", (_WORKER_ID,))
+                _set_state(conn, "last_run_at", time.time())
+        finally:
+            conn.close()
+
+
+def record_access(document_ids: List[str], filename: str = None):
+    """Mark documents as accessed now so they survive TTL and LRU eviction"""
+    document_ids = [doc_id for doc_id in set(document_ids) if doc_id]
+    if not document_ids:
+        return
+    now = time.time()
+    try:
+        with _registry_lock:
+            conn = _connect()
+            try:
+                with conn:
+                    for document_id in document_ids:
+                        conn.execute(
+                            """INSERT INTO document_access (document_id, filename, created_at, last_accessed, access_count)
+                               VALUES (?, ?, ?, ?, 1)
+                               ON CONFLICT(document_id) DO UPDATE SET
+                                   last_accessed = excluded.last_accessed,
+                                   access_count = access_count + 1,
+                                   filename = COALESCE(excluded.filename, filename)""",
+                            (document_id, filename, now, now)
+                        )
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        # Access tracking must never break an analysis request
+        log_error("Failed to record document access", e)
+
+
+def _load_registry(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    rows = conn.execute(
+        "SELECT document_id, filename, created_at, last_accessed, access_count FROM document_access"
+    ).fetchall()
+    return {
+        row[0]: {"filename": row[1], "created_at": row[2], "last_accessed": row[3], "access_count": row[4]}
+        for row in rows
+    }
+
+
+def _scan_collection(collection) -> Dict:
+    """Group stored chunk ids by document and estimate their on-disk footprint"""
+    documents = {}
+    orphan_ids = []
+    orphan_bytes = 0
+    batch_size = 500
+    offset = 0
+
+    # Every chunk shares the same embedding dimension, so one sample is enough
+    sample = collection.get(include=["embeddings"], limit=1).get("embeddings")
+    embedding_bytes = len(sample[0]) * EMBEDDING_COMPONENT_BYTES if sample is not None and len(sample) else 0
+
+    while True:
+        batch = collection.get(
+            include=["documents", "metadatas"],
+            limit=batch_size,
+            offset=offset
+        )
+        ids = batch.get("ids") or []
+        if not ids:
+            break
+        texts = batch.get("documents") or [None] * len(ids)
+        metadatas = batch.get("metadatas") or [None] * len(ids)
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            size = len((text or "").encode("utf-8")) + embedding_bytes
+            document_id = (metadata or {}).get("document_id")
+            if not document_id:
+                orphan_ids.append(chunk_id)
+                orphan_bytes += size
+                continue
+            entry = documents.setdefault(document_id, {
+                "chunk_ids": [],
+                "bytes": 0,
+                "filename": (metadata or {}).get("filename")
+            })
+            entry["chunk_ids"].append(chunk_id)
+            entry["bytes"] += size
+        offset += len(ids)
+    return {
+        "documents": documents,
+        "orphan_ids": orphan_ids,
+        "orphan_bytes": orphan_bytes,
+        "embedding_bytes": embedding_bytes,
+        "total_chunks": offset
+    }
+
+
+def _sqlite_free_bytes() -> int:
+    """Bytes held by free pages in Chroma's SQLite file, reclaimable by VACUUM"""
+    chroma_sqlite = os.path.join(CHROMA_DB_PATH, "chroma.sqlite3")
+    if not os.path.exists(chroma_sqlite):
+        return 0
+    try:
+        conn = sqlite3.connect(chroma_sqlite, timeout=30)
+        try:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            return page_size * free_pages
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log_error("Failed to inspect ChromaDB SQLite file", e)
+        return 0
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def plan_collection_gc(ttl_days: float = DOCUMENT_TTL_DAYS, max_size_mb: float = DOCUMENT_MAX_SIZE_MB,
+                       client=None) -> Dict:
+    """Work out which documents and chunks a garbage collection run would delete"""
+    client = client or chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    try:
+        collection = client.get_collection(name=COLLECTION_NAME)
+    except Exception:
+        collection = None
+
+    scan = _scan_collection(collection) if collection else {
+        "documents": {}, "orphan_ids": [], "orphan_bytes": 0, "embedding_bytes": 0, "total_chunks": 0
+    }
+    stored = scan["documents"]
+
+    now = time.time()
+    with _registry_lock:
+        conn = _connect()
+        try:
+            registry = _load_registry(conn)
+            deleted_since_rebuild = _get_state(conn, "deleted_since_rebuild")
+        finally:
+            conn.close()
+
+    # Documents stored before tracking existed start their clock now
+    untracked_ids = [doc_id for doc_id in stored if doc_id not in registry]
+    for document_id in untracked_ids:
+        registry[document_id] = {
+            "filename": stored[document_id]["filename"],
+            "created_at": now, "last_accessed": now, "access_count": 0
+        }
+
+    stale_registry_ids = [doc_id for doc_id in registry if doc_id not in stored]
+
+    expired = set()
+    if ttl_days > 0:
+        cutoff = now - ttl_days * 86400
+        expired = {doc_id for doc_id in stored if registry[doc_id]["last_accessed"] < cutoff}
+
+    evicted = set()
+    if max_size_mb > 0:
+        budget = max_size_mb * 1024 * 1024
+        remaining = sum(info["bytes"] for doc_id, info in stored.items() if doc_id not in expired)
+        # Least recently used first
+        for document_id in sorted(stored, key=lambda doc_id: registry[doc_id]["last_accessed"]):
+            if remaining <= budget:
+                break
+            if document_id in expired:
+                continue
+            evicted.add(document_id)
+            remaining -= stored[document_id]["bytes"]
+
+    to_delete = expired | evicted
+    documents = [{
+        "document_id": doc_id,
+        "filename": stored[doc_id]["filename"],
+        "chunks": len(stored[doc_id]["chunk_ids"]),
+        "bytes": stored[doc_id]["bytes"],
+        "last_accessed": registry[doc_id]["last_accessed"],
+        "reason": "ttl" if doc_id in expired else "lru"
+    } for doc_id in sorted(to_delete, key=lambda doc_id: registry[doc_id]["last_accessed"])]
+
+    chunk_ids = [chunk_id for doc_id in to_delete for chunk_id in stored[doc_id]["chunk_ids"]]
+    deleted_chunks = len(chunk_ids) + len(scan["orphan_ids"])
+    deleted_bytes = sum(stored[doc_id]["bytes"] for doc_id in to_delete) + scan["orphan_bytes"]
+    # HNSW segment files only shrink when the vector index is rebuilt
+    index_bytes = deleted_chunks * scan["embedding_bytes"]
+    index_rebuild_due = deleted_chunks > 0 and (
+        deleted_since_rebuild + deleted_chunks >= INDEX_REBUILD_RATIO * scan["total_chunks"]
+    )
+
+    return {
+        "documents": documents,
+        "chunk_ids": chunk_ids,
+        "orphan_ids": scan["orphan_ids"],
+        "stale_registry_ids": stale_registry_ids,
+        "untracked": {doc_id: stored[doc_id]["filename"] for doc_id in untracked_ids},
+        "reclaimable_bytes": deleted_bytes - index_bytes,
+        "index_bytes": index_bytes,
+        "deleted_since_rebuild": int(deleted_since_rebuild),
+        "index_rebuild_due": index_rebuild_due,
+        "sqlite_free_bytes": _sqlite_free_bytes(),
+        "store_bytes": _directory_size(CHROMA_DB_PATH),
+        "total_documents": len(stored)
+    }
+
+
+def compact_store():
+    """Reclaim free pages left in the SQLite files under ./chroma_db after deletions"""
+    from lexical_index import LEXICAL_INDEX_PATH
+    for sqlite_path in [os.path.join(CHROMA_DB_PATH, "chroma.sqlite3"), LEXICAL_INDEX_PATH]:
+        if not os.path.exists(sqlite_path):
+            continue
+        conn = sqlite3.connect(sqlite_path, timeout=30)
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    with _registry_lock:
+        conn = _connect()
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+
+def rebuild_vector_index(client) -> int:
+    """Copy live records into a fresh collection so deleted vectors leave the HNSW segment
+
+    Records are copied to a staging collection that replaces the original once complete;
+    a run interrupted after the original was dropped is finished by the next call.
+    """
+    existing = [c if isinstance(c, str) else c.name for c in client.list_collections()]
+    if COMPACTING_COLLECTION_NAME in existing:
+        if COLLECTION_NAME not in existing:
+            client.get_collection(name=COMPACTING_COLLECTION_NAME).modify(name=COLLECTION_NAME)
+            return 0
+        client.delete_collection(name=COMPACTING_COLLECTION_NAME)
+    if COLLECTION_NAME not in existing:
+        return 0
+
+    source = client.get_collection(name=COLLECTION_NAME)
+    target = client.create_collection(name=COMPACTING_COLLECTION_NAME, metadata=source.metadata or None)
+    copied = set()
+    batch_size = 500
+    # Second pass picks up chunks ingested while the first pass was copying
+    for _ in range(2):
+        offset = 0
+        while True:
+            batch = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+            ids = batch.get("ids") or []
+            if not ids:
+                break
+            new = [i for i, chunk_id in enumerate(ids) if chunk_id not in copied]
+            if new:
+                target.add(
+                    ids=[ids[i] for i in new],
+                    embeddings=[list(batch["embeddings"][i]) for i in new],
+                    documents=[batch["documents"][i] for i in new],
+                    metadatas=[batch["metadatas"][i] for i in new]
+                )
+                copied.update(ids[i] for i in new)
+            offset += len(ids)
+
+    client.delete_collection(name=COLLECTION_NAME)
+    target.modify(name=COLLECTION_NAME)
+    return len(copied)
+
+
+def run_collection_gc(ttl_days: float = DOCUMENT_TTL_DAYS, max_size_mb: float = DOCUMENT_MAX_SIZE_MB,
+                      dry_run: bool = True, compact: bool = False, rebuild_index: bool = False,
+                      min_interval_seconds: float = 0) -> Optional[Dict]:
+    """Expire documents by TTL/LRU budget, drop orphaned chunks and optionally compact the store
+
+    Applied runs hold a cross-process lease so only one worker deletes and compacts at a time.
+    Returns None when another worker is collecting, or when a run finished less than
+    min_interval_seconds ago (used by background workers to share one schedule).
+    """
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    if dry_run:
+        plan = plan_collection_gc(ttl_days=ttl_days, max_size_mb=max_size_mb, client=client)
+        plan["dry_run"] = True
+        return plan
+
+    skipped = _acquire_gc_lease(min_interval_seconds)
+    if skipped == "running":
+        log_info("Document GC already running in another worker, skipping")
+        return None
+    if skipped == "not_due":
+        log_info("Document GC ran recently in another worker, skipping this cycle")
+        return None
+    try:
+        plan = plan_collection_gc(ttl_days=ttl_days, max_size_mb=max_size_mb, client=client)
+        plan["dry_run"] = False
+        return _apply_collection_gc(plan, client, compact, rebuild_index)
+    finally:
+        _release_gc_lease()
+
+
+def _apply_collection_gc(plan: Dict, client, compact: bool, rebuild_index: bool) -> Dict:
+    chunk_ids = plan["chunk_ids"] + plan["orphan_ids"]
+    if chunk_ids:
+        collection = client.get_collection(name=COLLECTION_NAME)
+        batch_size = 500
+        for start in range(0, len(chunk_ids), batch_size):
+            collection.delete(ids=chunk_ids[start:start + batch_size])
+        # Imported here because lexical_index depends on this module's paths
+        from lexical_index import lexical_index
+        lexical_index.remove(chunk_ids)
+
+    removed_ids = {doc["document_id"] for doc in plan["documents"]} | set(plan["stale_registry_ids"])
+    adopted = {doc_id: filename for doc_id, filename in plan["untracked"].items() if doc_id not in removed_ids}
+    now = time.time()
+    with _registry_lock:
+        conn = _connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "DELETE FROM document_access WHERE document_id = ?",
+                    [(doc_id,) for doc_id in removed_ids]
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO document_access VALUES (?, ?, ?, ?, 0)",
+                    [(doc_id, filename, now, now) for doc_id, filename in adopted.items()]
+                )
+        finally:
+            conn.close()
+
+    plan["index_rebuilt"] = False
+    if compact and (rebuild_index or plan["index_rebuild_due"]):
+        rebuild_vector_index(client)
+        plan["index_rebuilt"] = True
+    with _registry_lock:
+        conn = _connect()
+        try:
+            with conn:
+                deleted = 0 if plan["index_rebuilt"] else plan["deleted_since_rebuild"] + len(chunk_ids)
+                _set_state(conn, "deleted_since_rebuild", deleted)
+        finally:
+            conn.close()
+
+    if compact:
+        compact_store()
+    plan["store_bytes_after"] = _directory_size(CHROMA_DB_PATH)
+
+    log_info(
+        f"Document GC removed {len(plan['documents'])} documents, "
+        f"{len(plan['orphan_ids'])} orphaned chunks"
+    )
+    return plan
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+
+def print_gc_report(report: Dict):
+    """Print a human-readable summary of a garbage collection run"""
+    mode = "DRY RUN" if report["dry_run"] else "APPLIED"
+    print(f"🧹 DOCUMENT GARBAGE COLLECTION ({mode})")
+    print("=" * 60)
+    print(f"📚 Documents in collection: {report['total_documents']}")
+    print(f"💾 Store size on disk: {_format_bytes(report['store_bytes'])}")
+    print()
+    if report["documents"]:
+        print("🗑️  Documents to remove:" if report["dry_run"] else "🗑️  Documents removed:")
+        for doc in report["documents"]:
+            last_accessed = time.strftime("%Y-%m-%d %H:%M", time.localtime(doc["last_accessed"]))
+            print(f"   • {doc['document_id']} ({doc['filename'] or 'unknown'}) - "
+                  f"{doc['chunks']} chunks, {_format_bytes(doc['bytes'])}, "
+                  f"last accessed {last_accessed} [{doc['reason']}]")
+    else:
+        print("✅ No documents past their TTL or size budget")
+    print(f"🧩 Orphaned chunks: {len(report['orphan_ids'])}")
+    print(f"📇 Stale registry entries: {len(report['stale_registry_ids'])}")
+    print()
+    print(f"♻️  Reclaimable from deletions (after VACUUM): {_format_bytes(report['reclaimable_bytes'])}")
+    print(f"📦 Free pages reclaimable by VACUUM: {_format_bytes(report['sqlite_free_bytes'])}")
+    print(f"🧭 Vector index space (needs index rebuild): {_format_bytes(report['index_bytes'])}")
+    if report["dry_run"]:
+        due = "yes" if report["index_rebuild_due"] else "no"
+        print(f"   Rebuild due with --compact: {due} "
+              f"({report['deleted_since_rebuild']} chunks deleted since last rebuild)")
+    elif report.get("index_rebuilt"):
+        print("   Vector index rebuilt")
+    if "store_bytes_after" in report:
+        print(f"💾 Store size after: {_format_bytes(report['store_bytes_after'])}")
+    print("=" * 60)
+
+
+def start_background_gc(interval_hours: float = DOCUMENT_GC_INTERVAL_HOURS) -> bool:
+    """Run garbage collection periodically in a daemon thread"""
+    global _gc_thread
+    if interval_hours <= 0 or (_gc_thread and _gc_thread.is_alive()):
+        return False
+
+    def _loop():
+        while True:
+            time.sleep(interval_hours * 3600)
+            try:
+                # Workers share one schedule: skip if any worker collected within the interval (with slack for timer drift)
+                run_collection_gc(dry_run=False, compact=True, min_interval_seconds=interval_hours * 3600 * 0.9)
+            except Exception as e:
+                log_error("Background document GC failed", e)
+
+    _gc_thread = threading.Thread(target=_loop, name="document-gc", daemon=True)
+    _gc_thread.start()
+    log_info(f"Background document GC scheduled every {interval_hours}h")
+    return True
+
+
+def main():
+    """Command-line entry point for document garbage collection"""
+    parser = argparse.ArgumentParser(description="Expire and compact stored medical documents")
+    parser.add_argument("--ttl-days", type=float, default=DOCUMENT_TTL_DAYS,
+                        help="Delete documents not accessed for this many days (0 disables)")
+    parser.add_argument("--max-size-mb", type=float, default=DOCUMENT_MAX_SIZE_MB,
+                        help="Evict least recently used documents above this size (0 disables)")
+    parser.add_argument("--apply", action="store_true",
+                        help="Actually delete; without this flag only a dry-run report is printed")
+    parser.add_argument("--compact", action="store_true",
+                        help="VACUUM the SQLite files and rebuild the vector index when enough chunks were deleted")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="With --compact, always rebuild the vector index")
+    args = parser.parse_args()
+
+    report = run_collection_gc(
+        ttl_days=args.ttl_days,
+        max_size_mb=args.max_size_mb,
+        dry_run=not args.apply,
+        compact=args.compact,
+        rebuild_index=args.rebuild_index
+    )
+    if report is None:
+        print("⏳ Garbage collection is already running in another worker")
+        return
+    print_gc_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Lexical (BM25) Index for exact medical-term lookups
+Inverted index over chunk text persisted next to ChromaDB, used alongside vector search
+"""
+
+import os
+import re
+import math
+import sqlite3
+import threading
+import argparse
+from collections import Counter
+from typing import List, Tuple
+
+from langsmith_config import log_info
+from document_lifecycle import CHROMA_DB_PATH, COLLECTION_NAME
+
+LEXICAL_INDEX_PATH = os.path.join(CHROMA_DB_PATH, "lexical_index.sqlite3")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion constant
+RRF_K = 60
+
+# Drug names, dosages and codes keep their inner punctuation: e11.9, 5-fu, 500mg, nct01234567
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*", re.IGNORECASE)
+ACRONYM_PATTERN = re.compile(r"[A-Z][A-Z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "which", "with",
+    "does", "do", "about", "any", "there", "their", "its", "mean", "means", "tell", "me"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; compound codes are indexed whole and by their parts"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[.\-/]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def exact_terms(query: str) -> List[str]:
+    """Whole tokens that need an exact match: anything with a digit, plus acronyms"""
+    terms = [
+        token.lower() for token in TOKEN_PATTERN.findall(query)
+        if any(ch.isdigit() for ch in token) or ACRONYM_PATTERN.fullmatch(token)
+    ]
+    return list(dict.fromkeys(terms))
+
+
+def is_term_query(query: str) -> bool:
+    """True when exact terms dominate the query, so lexical search can answer it alone"""
+    terms = exact_terms(query)
+    if not terms:
+        return False
+    content_words = {token for token in TOKEN_PATTERN.findall(query.lower()) if token not in STOPWORDS}
+    return len(terms) * 2 >= len(content_words)
+
+
+def answers_locally(query: str, chunk_texts: List[str]) -> bool:
+    """True when a term-heavy query has every exact term in one of the top lexical chunks
+
+    query_chromadb uses this to skip the embedding call and dense search.
+    """
+    if not is_term_query(query):
+        return False
+    terms = set(exact_terms(query))
+    return any(terms <= set(tokenize(text or "")) for text in chunk_texts)
+
+
+class LexicalIndex:
+    """BM25 inverted index stored in SQLite"""
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS lexical_chunks (
+                chunk_id TEXT PRIMARY KEY,
+                document_id TEXT,
+                length INTEGER NOT NULL
+            )"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS lexical_postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_chunk ON lexical_postings (chunk_id)")
+        return conn
+
+    def add(self, chunk_ids: List[str], chunks: List[str], document_id: str = None):
+        """Index chunk texts under their ChromaDB ids"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    for chunk_id, text in zip(chunk_ids, chunks):
+                        counts = Counter(tokenize(text))
+                        conn.execute("DELETE FROM lexical_postings WHERE chunk_id = ?", (chunk_id,))
+                        conn.execute(
+                            "INSERT OR REPLACE INTO lexical_chunks (chunk_id, document_id, length) VALUES (?, ?, ?)",
+                            (chunk_id, document_id, sum(counts.values()))
+                        )
+                        conn.executemany(
+                            "INSERT INTO lexical_postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                            [(term, chunk_id, tf) for term, tf in counts.items()]
+                        )
+            finally:
+                conn.close()
+
+    def remove(self, chunk_ids: List[str]):
+        """Drop chunks from the index, e.g. after garbage collection"""
+        if not chunk_ids:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany("DELETE FROM lexical_postings WHERE chunk_id = ?", [(c,) for c in chunk_ids])
+                    conn.executemany("DELETE FROM lexical_chunks WHERE chunk_id = ?", [(c,) for c in chunk_ids])
+            finally:
+                conn.close()
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """Return (chunk_id, bm25_score) pairs for the best matching chunks"""
+        terms = list(dict.fromkeys(token for token in tokenize(query) if token not in STOPWORDS))
+        if not terms:
+            return []
+        conn = self._connect()
+        try:
+            total_chunks, avg_length = conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM lexical_chunks"
+            ).fetchone()
+            if not total_chunks:
+                return []
+            placeholders = ",".join("?" * len(terms))
+            doc_freq = dict(conn.execute(
+                f"SELECT term, COUNT(*) FROM lexical_postings WHERE term IN ({placeholders}) GROUP BY term",
+                terms
+            ).fetchall())
+            postings = conn.execute(
+                f"""SELECT p.term, p.chunk_id, p.tf, c.length
+                    FROM lexical_postings p JOIN lexical_chunks c ON c.chunk_id = p.chunk_id
+                    WHERE p.term IN ({placeholders})""",
+                terms
+            ).fetchall()
+        finally:
+            conn.close()
+
+        avg_length = avg_length or 1
+        scores = Counter()
+        for term, chunk_id, tf, length in postings:
+            df = doc_freq[term]
+            idf = math.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+        return scores.most_common(n_results)
+
+    def chunk_count(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM lexical_chunks").fetchone()[0]
+        finally:
+            conn.close()
+
+    def rebuild_from_collection(self, collection) -> int:
+        """Re-index every chunk already stored in a ChromaDB collection"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM lexical_postings")
+                    conn.execute("DELETE FROM lexical_chunks")
+            finally:
+                conn.close()
+        indexed = 0
+        batch_size = 500
+        while True:
+            batch = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=indexed)
+            ids = batch.get("ids") or []
+            if not ids:
+                break
+            metadatas = batch.get("metadatas") or [{}] * len(ids)
+            for chunk_id, text, metadata in zip(ids, batch.get("documents") or [], metadatas):
+                self.add([chunk_id], [text or ""], (metadata or {}).get("document_id"))
+            indexed += len(ids)
+        return indexed
+
+
+def reciprocal_rank_fusion(*rankings: List[str], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Merge ranked id lists; ids ranked high in any list float to the top"""
+    fused = Counter()
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            fused[chunk_id] += 1 / (k + rank + 1)
+    return fused.most_common()
+
+
+lexical_index = LexicalIndex()
+
+
+def main():
+    """Command-line entry point for inspecting and rebuilding the lexical index"""
+    parser = argparse.ArgumentParser(description="Manage the BM25 lexical index")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Re-index all chunks currently stored in ChromaDB")
+    parser.add_argument("--search", type=str, help="Run a lexical query and print the top chunk ids")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        import chromadb
+        client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        indexed = lexical_index.rebuild_from_collection(client.get_collection(name=COLLECTION_NAME))
+        log_info(f"Rebuilt lexical index with {indexed} chunks")
+        print(f"✅ Indexed {indexed} chunks")
+    if args.search:
+        for chunk_id, score in lexical_index.search(args.search):
+            print(f"   • {chunk_id}  bm25={score:.3f}")
+    if not (args.rebuild or args.search):
+        print(f"📚 Lexical index: {lexical_index.chunk_count()} chunks at {LEXICAL_INDEX_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Single-flight Request Coalescing for the AI Medical Research Agent
+Concurrent identical requests share one in-flight computation, in-process and across workers
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict
+from dotenv import load_dotenv
+
+from langsmith_config import log_info, log_error
+from document_lifecycle import CHROMA_DB_PATH
+
+load_dotenv()
+
+COALESCING_DB_PATH = os.path.join(CHROMA_DB_PATH, "request_coalescing.sqlite3")
+
+# A leader that has not finished within the lease is presumed dead and replaced
+LEASE_SECONDS = float(os.getenv("COALESCE_LEASE_SECONDS", "300"))
+# How long a finished result stays readable by workers that were already waiting on it
+RESULT_TTL_SECONDS = float(os.getenv("COALESCE_RESULT_TTL_SECONDS", "30"))
+POLL_INTERVAL_SECONDS = 0.2
+
+_WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class _Call:
+    """An in-flight computation that local callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight: Dict[str, _Call] = {}
+_inflight_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the lease database, creating it on first use"""
+    os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+    conn = sqlite3.connect(COALESCING_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS flight_lease (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            result TEXT,
+            completed_at REAL
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS flight_metrics (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )"""
+    )
+    return conn
+
+
+def _increment(metric: str):
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                """INSERT INTO flight_metrics (name, value) VALUES (?, 1)
+                   ON CONFLICT(name) DO UPDATE SET value = value + 1""",
+                (metric,)
+            )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        # Metrics must never break an analysis request
+        log_error(f"Failed to record coalescing metric {metric}", e)
+
+
+def get_coalescing_metrics() -> Dict[str, int]:
+    """Return executed and coalesced request counts across all workers"""
+    if not os.path.exists(COALESCING_DB_PATH):
+        return {}
+    try:
+        conn = sqlite3.connect(f"file:{COALESCING_DB_PATH}?mode=ro", uri=True, timeout=30)
+        try:
+            return dict(conn.execute("SELECT name, value FROM flight_metrics").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log_error("Failed to read coalescing metrics", e)
+        return {}
+
+
+def _acquire_or_wait(key: str):
+    """Take the cross-process lease for key, or wait for its holder's result
+
+    Returns (True, None) when this worker became the leader and (False, result)
+    when another worker finished a computation this caller was waiting on.
+    Results completed before this caller started waiting are never reused.
+    """
+    waited_on = None
+    while True:
+        now = time.time()
+        conn = _connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT owner, expires_at, result, completed_at FROM flight_lease WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row and row[3] is not None and (row[0], row[1]) == waited_on:
+                conn.execute("COMMIT")
+                return False, json.loads(row[2])
+            if row and row[3] is None and row[1] >= now:
+                # Remember which lease we are waiting on so only its result is shared
+                waited_on = (row[0], row[1])
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO flight_lease (key, owner, expires_at, result, completed_at) "
+                    "VALUES (?, ?, ?, NULL, NULL)",
+                    (key, _WORKER_ID, now + LEASE_SECONDS)
+                )
+                # Drop finished leases nobody can still be polling for
+                conn.execute(
+                    "DELETE FROM flight_lease WHERE completed_at IS NOT NULL AND completed_at < ?",
+                    (now - RESULT_TTL_SECONDS,)
+                )
+                conn.execute("COMMIT")
+                return True, None
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+
+def _release(key: str, result_json: str = None, failed: bool = False):
+    conn = _connect()
+    try:
+        if failed:
+            # Let a waiting worker take over instead of sharing the failure
+            conn.execute("DELETE FROM flight_lease WHERE key = ? AND owner = ?", (key, _WORKER_ID))
+        else:
+            conn.execute(
+                "UPDATE flight_lease SET result = ?, completed_at = ? WHERE key = ? AND owner = ?",
+                (result_json, time.time(), key, _WORKER_ID)
+            )
+    finally:
+        conn.close()
+
+
+def _safe_release(key: str, result_json: str = None, failed: bool = False):
+    try:
+        _release(key, result_json, failed)
+    except sqlite3.Error as e:
+        # Waiting workers take over once the lease expires
+        log_error("Failed to release coalescing lease", e)
+
+
+def single_flight(key: str, fn: Callable[[], Any]) -> Any:
+    """Run fn once for all concurrent callers with the same key and share its result
+
+    Callers in this process wait on the in-flight call directly; callers in other
+    processes wait on a SQLite lease and read the JSON-encoded result, so only
+    JSON-serializable results are shared across workers.
+    """
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _inflight[key] = call
+
+    if not leader:
+        call.done.wait()
+        _increment("coalesced_local")
+        log_info(f"Coalesced request {key[:40]} onto in-flight call")
+        if call.error:
+            raise call.error
+        return call.result
+
+    try:
+        try:
+            acquired, result = _acquire_or_wait(key)
+        except sqlite3.Error as e:
+            # Without the lease database, compute locally rather than fail the request
+            log_error("Failed to coordinate request across workers", e)
+            acquired, result = None, None
+        if acquired is not False:
+            try:
+                result = fn()
+            except Exception:
+                if acquired:
+                    _safe_release(key, failed=True)
+                raise
+            if acquired:
+                try:
+                    result_json = json.dumps(result)
+                except (TypeError, ValueError) as e:
+                    # Other workers recompute; local callers still share the result
+                    log_error("Coalesced result is not JSON-serializable", e)
+                    _safe_release(key, failed=True)
+                else:
+                    _safe_release(key, result_json)
+            _increment("executed")
+        else:
+            _increment("coalesced_remote")
+            log_info(f"Coalesced request {key[:40]} onto another worker")
+        call.result = result
+        return result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
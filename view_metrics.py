@@ -5,6 +5,7 @@ This script now redirects to LangSmith for comprehensive metrics and evaluation
 """
 
 from langsmith_config import get_project_url
+from request_coalescing import get_coalescing_metrics
 
 def main():
     """Main function to display LangSmith dashboard information"""
@@ -43,6 +44,13 @@ def main():
         print("      LANGSMITH_PROJECT=ai-medical-research-agent")
         print("   3. Restart the application")
     
+    print()
+    coalescing = get_coalescing_metrics()
+    print("🔗 Request Coalescing (all workers):")
+    print(f"   • Executed: {coalescing.get('executed', 0)}")
+    print(f"   • Coalesced in-process: {coalescing.get('coalesced_local', 0)}")
+    print(f"   • Coalesced across workers: {coalescing.get('coalesced_remote', 0)}")
+    
     print()
     print("=" * 60)
 